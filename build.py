@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """Build script for Layer Monitor using Nuitka."""
 
+import importlib.util
+import shutil
 import subprocess
 import sys
 import os
@@ -37,21 +39,24 @@ def hsv_to_rgb(h, s, v):
     return int((r + m) * 255), int((g + m) * 255), int((b + m) * 255)
 
 
-def create_icon_png(size, output_path):
-    """Create a PNG icon with '0' on green background."""
-    from PIL import Image, ImageDraw, ImageFont
+LAYER_0_RGB = hsv_to_rgb(*LAYER_0_HSV)
 
-    h, s, v = LAYER_0_HSV
-    r, g, b = hsv_to_rgb(h, s, v)
 
-    img = Image.new('RGB', (size, size), (r, g, b))
-    draw = ImageDraw.Draw(img)
+def text_color_for(rgb):
+    """Pick black or white text for contrast against the given background."""
+    r, g, b = rgb
+    brightness = (r * 299 + g * 587 + b * 114) / 1000
+    return (0, 0, 0) if brightness > 128 else (255, 255, 255)
 
-    # Calculate font size (roughly 60% of icon size)
-    font_size = int(size * 0.6)
+
+LAYER_0_TEXT_RGB = text_color_for(LAYER_0_RGB)
+
+
+def load_icon_font(font_size):
+    """Load a bold system font at the given size."""
+    from PIL import ImageFont
 
     # Try to use a bold system font (cross-platform)
-    font = None
     font_paths = []
     if sys.platform == "darwin":
         font_paths = ['/System/Library/Fonts/Helvetica.ttc',
@@ -68,17 +73,23 @@ def create_icon_png(size, output_path):
 
     for font_name in font_paths:
         try:
-            font = ImageFont.truetype(font_name, font_size)
-            break
+            return ImageFont.truetype(font_name, font_size)
         except (OSError, IOError):
             continue
 
-    if font is None:
-        font = ImageFont.load_default()
+    return ImageFont.load_default()
 
-    # Calculate text color (black for bright backgrounds)
-    brightness = (r * 299 + g * 587 + b * 114) / 1000
-    text_color = (0, 0, 0) if brightness > 128 else (255, 255, 255)
+
+def create_icon_image(size):
+    """Create an in-memory icon image with '0' on green background."""
+    from PIL import Image, ImageDraw
+
+    # Image.new fills the background in a single C pass
+    img = Image.new('RGB', (size, size), LAYER_0_RGB)
+    draw = ImageDraw.Draw(img)
+
+    # Calculate font size (roughly 60% of icon size)
+    font = load_icon_font(int(size * 0.6))
 
     # Center the text
     text = "0"
@@ -88,12 +99,46 @@ def create_icon_png(size, output_path):
     x = (size - text_width) // 2
     y = (size - text_height) // 2 - bbox[1]
 
-    draw.text((x, y), text, fill=text_color, font=font)
-    img.save(output_path, 'PNG')
+    draw.text((x, y), text, fill=LAYER_0_TEXT_RGB, font=font)
+    return img
+
+
+def create_icon_png(size, output_path):
+    """Create a PNG icon with '0' on green background."""
+    create_icon_image(size).save(output_path, 'PNG')
+
+
+def _write_icns_imageio(png_paths, output_path):
+    """Write an .icns in-process with ImageIO (via pyobjc).
+
+    Returns False if pyobjc is unavailable or ImageIO fails, so the caller
+    can fall back to iconutil.
+    """
+    try:
+        import Quartz
+        from Foundation import NSURL
+    except ImportError:
+        return False
+
+    dest = Quartz.CGImageDestinationCreateWithURL(
+        NSURL.fileURLWithPath_(output_path), "com.apple.icns", len(png_paths), None)
+    if dest is None:
+        return False
+
+    for png_path in png_paths:
+        source = Quartz.CGImageSourceCreateWithURL(NSURL.fileURLWithPath_(png_path), None)
+        if source is None:
+            return False
+        image = Quartz.CGImageSourceCreateImageAtIndex(source, 0, None)
+        Quartz.CGImageDestinationAddImage(dest, image, None)
+
+    return bool(Quartz.CGImageDestinationFinalize(dest))
 
 
 def create_macos_icns(output_path):
     """Create a macOS .icns file."""
+    from PIL import Image
+
     # Icon sizes required for .icns
     sizes = [16, 32, 64, 128, 256, 512, 1024]
 
@@ -101,43 +146,44 @@ def create_macos_icns(output_path):
         iconset_dir = os.path.join(tmpdir, 'AppIcon.iconset')
         os.makedirs(iconset_dir)
 
+        # Render the largest icon once and downscale it for the rest
+        largest = max(sizes)
+        master = create_icon_image(largest)
+        master.save(os.path.join(iconset_dir, f'icon_{largest}x{largest}.png'), 'PNG')
+
+        # Resize from the in-memory master; no PNG decode round-trip
         for size in sizes:
-            # Standard resolution
-            create_icon_png(size, os.path.join(iconset_dir, f'icon_{size}x{size}.png'))
-            # Retina resolution (2x)
-            if size <= 512:
-                create_icon_png(size * 2, os.path.join(iconset_dir, f'icon_{size}x{size}@2x.png'))
-
-        # Use iconutil to create .icns
-        subprocess.run(['iconutil', '-c', 'icns', iconset_dir, '-o', output_path], check=True)
+            if size != largest:
+                master.resize((size, size), Image.LANCZOS).save(
+                    os.path.join(iconset_dir, f'icon_{size}x{size}.png'), 'PNG')
+
+        # Write the .icns in-process when possible; ImageIO only needs one
+        # image per pixel size, so the @2x copies are made just for iconutil
+        png_paths = [os.path.join(iconset_dir, f'icon_{size}x{size}.png') for size in sizes]
+        if not _write_icns_imageio(png_paths, output_path):
+            # Each @2x image is the 1x image of twice the size
+            for size in sizes:
+                if size <= 512:
+                    shutil.copyfile(
+                        os.path.join(iconset_dir, f'icon_{size * 2}x{size * 2}.png'),
+                        os.path.join(iconset_dir, f'icon_{size}x{size}@2x.png'))
+            subprocess.run(['iconutil', '-c', 'icns', iconset_dir, '-o', output_path], check=True)
         print(f"Created {output_path}")
 
 
 def create_windows_ico(output_path):
     """Create a Windows .ico file."""
-    from PIL import Image
-
     # Windows icon sizes
     sizes = [16, 32, 48, 64, 128, 256]
-    images = []
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        for size in sizes:
-            png_path = os.path.join(tmpdir, f'icon_{size}.png')
-            create_icon_png(size, png_path)
-            img = Image.open(png_path)
-            img.load()  # Force load into memory so file can be closed
-            images.append(img)
 
-        # Save as ICO with multiple sizes
-        images[0].save(output_path, format='ICO', sizes=[(s, s) for s in sizes],
-                       append_images=images[1:])
+    # Render straight to memory; no PNG encode/decode round-trip
+    images = [create_icon_image(size) for size in sizes]
 
-        # Close all images to release file handles (needed on Windows)
-        for img in images:
-            img.close()
+    # Save as ICO with multiple sizes
+    images[0].save(output_path, format='ICO', sizes=[(s, s) for s in sizes],
+                   append_images=images[1:])
 
-        print(f"Created {output_path}")
+    print(f"Created {output_path}")
 
 
 def create_linux_png(output_path):
@@ -169,9 +215,37 @@ INFO_PLIST = """\
 </plist>
 """
 
+HIDPROXY_BACKEND_PATH = "src/main/python/_hidproxy_backend.py"
+
+
+def select_hid_backend():
+    """Pick the HID module hidproxy would choose at runtime on this platform."""
+    if sys.platform == "linux":
+        preferred, fallback = "hidraw", "hid"
+    else:
+        preferred, fallback = "hid", "hidraw"
+    if importlib.util.find_spec(preferred) is not None:
+        return preferred, fallback
+    return fallback, preferred
+
+
+def write_hidproxy_backend(backend):
+    """Pin the HID backend so Nuitka only follows the chosen module."""
+    with open(HIDPROXY_BACKEND_PATH, "w") as f:
+        f.write("# Generated by build.py - do not edit\n")
+        if backend == "hid":
+            f.write("import hid\n")
+        else:
+            f.write(f"import {backend} as hid\n")
+    print(f"Created {HIDPROXY_BACKEND_PATH} ({backend})")
+
+
 def build():
     os.makedirs("dist", exist_ok=True)
 
+    backend, unused_backend = select_hid_backend()
+    write_hidproxy_backend(backend)
+
     # Generate platform-specific icon before build
     icon_arg = None
     if sys.platform == "darwin":
@@ -191,6 +265,7 @@ def build():
         "--onefile",
         "--enable-plugin=pyside6",
         "--output-dir=dist",
+        f"--nofollow-import-to={unused_backend}",
         "src/main/python/main.py",
     ]
 
@@ -206,7 +281,12 @@ def build():
         cmd.append("--windows-console-mode=disable")
 
     print("Building with:", " ".join(cmd))
-    subprocess.run(cmd, check=True)
+    # close_fds=False lets CPython use posix_spawn instead of fork+exec; fds
+    # are non-inheritable by default (PEP 446), so nothing extra leaks
+    proc = subprocess.Popen(cmd, executable=sys.executable, close_fds=False)
+    rc = proc.wait()
+    if rc:
+        raise SystemExit(rc)
 
     # Create Info.plist and icon for macOS (LSUIElement hides from dock)
     if sys.platform == "darwin":
@@ -3,6 +3,7 @@
 Device discovery and management for layer monitor.
 """
 
+import os
 import time
 import logging
 import sys
@@ -18,34 +19,56 @@ VIA3_MIN_PROTOCOL = 12
 
 MSG_LEN = 32
 
+# Brief retries for freshly plugged devices whose node isn't ready yet;
+# anything longer is left to the caller's periodic device poll
+OPEN_RETRIES = 3
+OPEN_RETRY_DELAY = 0.05
+
+# (usage_page, usage) pairs for Viable (0xFF61/0x62) and VIA (0xFF60/0x61)
+VIABLE_USAGES = frozenset({(0xFF61, 0x62), (0xFF60, 0x61)})
+
+
+def hid_topology_token():
+    """Get a cheap token that changes when HID devices come or go.
+
+    On Linux this is the set of hidraw nodes under /dev. Returns None where
+    no cheap check is available, meaning callers should always enumerate.
+    """
+    if sys.platform != "linux":
+        return None
+    try:
+        return frozenset(name for name in os.listdir("/dev") if name.startswith("hidraw"))
+    except OSError:
+        return None
+
 
 def find_viable_devices(quiet=False):
     """Find all connected Viable keyboards."""
     devices = []
     seen_paths = set()
+    magic = VIABLE_SERIAL_NUMBER_MAGIC
+    usages = VIABLE_USAGES
 
     for dev in hid.enumerate():
-        if dev["path"] in seen_paths:
+        path = dev["path"]
+        if path in seen_paths:
             continue
 
-        # Check for Viable (0xFF61/0x62) or VIA (0xFF60/0x61) usage page
-        is_viable = dev["usage_page"] == 0xFF61 and dev["usage"] == 0x62
-        is_via = dev["usage_page"] == 0xFF60 and dev["usage"] == 0x61
-
-        if not (is_viable or is_via):
+        # Check for Viable or VIA usage page
+        if (dev["usage_page"], dev["usage"]) not in usages:
             continue
 
-        # Check for Viable serial number magic
-        if VIABLE_SERIAL_NUMBER_MAGIC not in dev.get("serial_number", ""):
+        # Check for Viable serial number magic (backends may report None)
+        serial = dev.get("serial_number") or ""
+        if magic not in serial:
             continue
 
         if not quiet:
             logging.info("Found device: VID=%04X PID=%04X serial=%s path=%s",
-                        dev["vendor_id"], dev["product_id"],
-                        dev["serial_number"], dev["path"])
+                        dev["vendor_id"], dev["product_id"], serial, path)
 
         devices.append(dev)
-        seen_paths.add(dev["path"])
+        seen_paths.add(path)
 
     return devices
 
@@ -61,16 +84,19 @@ class KeyboardDevice:
     def open(self):
         """Open the HID device and initialize keyboard protocol."""
         self.dev = hid.device()
-        for x in range(10):
+        for x in range(OPEN_RETRIES):
             try:
                 self.dev.open_path(self.desc["path"])
                 break
             except OSError:
-                time.sleep(1)
+                time.sleep(OPEN_RETRY_DELAY)
         else:
+            self.dev = None
             raise RuntimeError("Unable to open device")
 
-        self.keyboard = Keyboard(self.dev)
+        cache_key = (self.desc["vendor_id"], self.desc["product_id"],
+                     self.desc.get("serial_number") or "")
+        self.keyboard = Keyboard(self.dev, cache_key=cache_key)
         self.keyboard.reload()
 
     def close(self):
@@ -86,6 +112,21 @@ class KeyboardDevice:
             return self.keyboard.get_current_layer()
         return None
 
+    def submit_layer_read(self):
+        """Request the current layer without waiting for the reply.
+
+        Returns True if the request was written.
+        """
+        if self.keyboard:
+            return self.keyboard.submit_layer_state()
+        return False
+
+    def poll_layer_completion(self):
+        """Get the layer from the latest completed request, if any."""
+        if self.keyboard:
+            return self.keyboard.poll_current_layer()
+        return None
+
     def get_layer_colors(self):
         """Get layer colors if available."""
         if self.keyboard and self.keyboard.layer_colors:
@@ -6,6 +6,7 @@ Layer Monitor - System tray application that displays the current keyboard layer
 
 import os
 import sys
+import time
 import logging
 from pathlib import Path
 
@@ -14,10 +15,10 @@ if sys.platform == "darwin":
     os.environ['QT_MAC_DISABLE_FOREGROUND_APPLICATION_TRANSFORM'] = '1'
 
 from PySide6.QtWidgets import QApplication, QSystemTrayIcon, QMenu
-from PySide6.QtGui import QIcon, QPixmap, QPainter, QColor, QFont
+from PySide6.QtGui import QIcon, QImage, QPixmap, QPainter, QColor, QFont
 from PySide6.QtCore import Qt, QTimer
 
-from device import find_viable_devices, KeyboardDevice
+from device import find_viable_devices, hid_topology_token, KeyboardDevice
 
 
 class AutoStart:
@@ -25,6 +26,9 @@ class AutoStart:
 
     APP_NAME = "LayerMonitor"
 
+    # Last known enabled state; None until first checked
+    _cached = None
+
     @classmethod
     def get_executable_path(cls):
         """Get the path to the running executable."""
@@ -45,6 +49,13 @@ class AutoStart:
     @classmethod
     def is_enabled(cls):
         """Check if auto-start is enabled."""
+        if cls._cached is None:
+            cls._cached = cls._check_enabled()
+        return cls._cached
+
+    @classmethod
+    def _check_enabled(cls):
+        """Query the platform for the current auto-start state."""
         if sys.platform == "darwin":
             plist_path = Path.home() / "Library/LaunchAgents/com.viable.layermonitor.plist"
             return plist_path.exists()
@@ -72,6 +83,7 @@ class AutoStart:
     @classmethod
     def enable(cls):
         """Enable auto-start."""
+        cls._cached = None
         exe_path = cls.get_executable_path()
 
         if sys.platform == "darwin":
@@ -134,6 +146,7 @@ X-GNOME-Autostart-enabled=true
     @classmethod
     def disable(cls):
         """Disable auto-start."""
+        cls._cached = None
         if sys.platform == "darwin":
             plist_path = Path.home() / "Library/LaunchAgents/com.viable.layermonitor.plist"
             if plist_path.exists():
@@ -194,6 +207,53 @@ DEFAULT_LAYER_COLORS = [
     (0, 0, 255),      # White
 ]
 
+# Device connection check interval (seconds)
+DEVICE_POLL_INTERVAL = 2.0
+
+# Layer polling interval: fast right after a change, slower once idle
+LAYER_POLL_FAST_MS = 200
+LAYER_POLL_IDLE_MS = 1000
+LAYER_POLL_IDLE_TICKS = 10  # Unchanged polls before backing off
+LAYER_MAX_MISSED = 5  # Polls without a reply before the keyboard counts as gone
+LAYER_REPLY_WAIT_MS = 10  # Delay between a layer request and reading its reply
+
+# Tray tooltips per layer, built once
+LAYER_TOOLTIPS = [f"Layer {layer}" for layer in range(16)]
+
+# Rendered tray icons keyed by (layer, h, s, v), shared across reconnects
+_ICON_CACHE = {}
+_ICON_FONT = None
+
+
+def _icon_font():
+    """Get the shared icon font (created lazily, after QApplication)."""
+    global _ICON_FONT
+    if _ICON_FONT is None:
+        _ICON_FONT = QFont()
+        _ICON_FONT.setPixelSize(20)
+        _ICON_FONT.setBold(True)
+    return _ICON_FONT
+
+
+# Pre-rendered layer number glyphs keyed by (layer, text_color)
+_GLYPH_CACHE = {}
+
+
+def _layer_glyph(layer, text_color):
+    """Get the layer number rendered once onto a transparent 32x32 image."""
+    key = (layer, text_color)
+    glyph = _GLYPH_CACHE.get(key)
+    if glyph is None:
+        glyph = QImage(32, 32, QImage.Format_ARGB32_Premultiplied)
+        glyph.fill(Qt.transparent)
+        painter = QPainter(glyph)
+        painter.setPen(text_color)
+        painter.setFont(_icon_font())
+        painter.drawText(glyph.rect(), Qt.AlignCenter, str(layer))
+        painter.end()
+        _GLYPH_CACHE[key] = glyph
+    return glyph
+
 
 class LayerMonitor:
     """System tray layer monitor application."""
@@ -205,13 +265,20 @@ class LayerMonitor:
         self.device = None
         self.current_layer = -1
         self.layer_icons = {}
+        self._missed_replies = 0
+        self._last_colors = [None] * 16  # (h, s, v) each icon was built from
+        self._idle_ticks = 0
+        # HID topology when the last search found nothing; only ever used to
+        # suppress repeat searches that would find nothing again
+        self._hid_token = None
 
         # Initialize layer icons with default colors
         self._init_layer_icons()
 
         # Create system tray icon
         self.tray_icon = QSystemTrayIcon()
-        self.tray_icon.setIcon(self.layer_icons.get(0, QIcon()))
+        self._shown_icon = self.layer_icons.get(0, QIcon())
+        self.tray_icon.setIcon(self._shown_icon)
         self.tray_icon.setToolTip("Layer Monitor - Searching for keyboard...")
 
         # Create context menu
@@ -229,45 +296,56 @@ class LayerMonitor:
         # Show menu on left-click too
         self.tray_icon.activated.connect(self._on_tray_activated)
 
-        # Set up polling timers
-        self.device_poll_timer = QTimer()
-        self.device_poll_timer.timeout.connect(self._poll_device)
-        self.device_poll_timer.start(2000)  # Check for device every 2 seconds
-
-        self.layer_poll_timer = QTimer()
-        self.layer_poll_timer.timeout.connect(self._poll_layer)
-        self.layer_poll_timer.start(200)  # Poll layer every 200ms
+        # Single polling timer drives both layer and device checks
+        self._next_device_check = time.monotonic() + DEVICE_POLL_INTERVAL
+        self._timer = QTimer()
+        self._timer.timeout.connect(self._tick)
+        self._timer.start(LAYER_POLL_FAST_MS)
 
         # Initial device search
         self._poll_device()
+        if not self.device:
+            self._poll_idle()
 
         self.tray_icon.show()
 
     def _init_layer_icons(self):
         """Initialize layer icons with default colors."""
-        for layer in range(16):
-            h, s, v = DEFAULT_LAYER_COLORS[layer]
-            self.layer_icons[layer] = self._create_layer_icon(layer, h, s, v)
+        self._set_layer_colors(DEFAULT_LAYER_COLORS)
+
+    def _set_layer_colors(self, colors):
+        """Rebuild icons only for layers whose (h, s, v) color changed."""
+        last = self._last_colors
+        if colors == last[:len(colors)]:
+            return
+        for layer, hsv in enumerate(colors):
+            if last[layer] != hsv:
+                self.layer_icons[layer] = self._create_layer_icon(layer, *hsv)
+                last[layer] = hsv
 
     def _create_layer_icon(self, layer, h, s, v):
         """Create a 32x32 icon with layer number on colored background."""
-        pixmap = QPixmap(32, 32)
+        key = (layer, h, s, v)
+        icon = _ICON_CACHE.get(key)
+        if icon is not None:
+            return icon
+
+        image = QImage(32, 32, QImage.Format_RGB32)
         color = QColor.fromHsv(h, s, v)
-        pixmap.fill(color)
+        image.fill(color)
 
-        painter = QPainter(pixmap)
         # Use contrasting text color
         brightness = (color.red() * 299 + color.green() * 587 + color.blue() * 114) / 1000
         text_color = Qt.black if brightness > 128 else Qt.white
-        painter.setPen(text_color)
-        font = QFont()
-        font.setPixelSize(20)
-        font.setBold(True)
-        painter.setFont(font)
-        painter.drawText(pixmap.rect(), Qt.AlignCenter, str(layer))
+
+        # Blend the pre-rendered glyph rather than laying out text per icon
+        painter = QPainter(image)
+        painter.drawImage(0, 0, _layer_glyph(layer, text_color))
         painter.end()
 
-        return QIcon(pixmap)
+        icon = QIcon(QPixmap.fromImage(image))
+        _ICON_CACHE[key] = icon
+        return icon
 
     def _on_tray_activated(self, reason):
         """Handle tray icon activation (click)."""
@@ -291,62 +369,141 @@ class LayerMonitor:
 
         colors = self.device.get_layer_colors()
         if colors:
-            for layer, (h, s) in enumerate(colors):
-                # V defaults to 255 for display
-                self.layer_icons[layer] = self._create_layer_icon(layer, h, s, 255)
+            # V defaults to 255 for display
+            self._set_layer_colors([(h, s, 255) for h, s in colors])
+
+    def _poll_idle(self):
+        """Tick at the idle rate while there is no keyboard to poll.
+
+        Only the device check runs until a keyboard connects; its first
+        layer change then switches back to the fast rate.
+        """
+        self._idle_ticks = LAYER_POLL_IDLE_TICKS
+        self._timer.setInterval(LAYER_POLL_IDLE_MS)
+
+    def _disconnect(self):
+        """Drop the current keyboard and go back to searching."""
+        logging.info("Keyboard disconnected")
+        self.device.close()
+        self.device = None
+        self.current_layer = -1
+        self._missed_replies = 0
+        # The keyboard may come back on the same hidraw node
+        self._hid_token = None
+        self._poll_idle()
+        self.status_action.setText("Searching for keyboard...")
+        self.tray_icon.setToolTip("Layer Monitor - Searching for keyboard...")
+        # Reset to default colors
+        self._init_layer_icons()
 
     def _poll_device(self):
         """Check for keyboard connection."""
         if self.device:
-            # Check if device is still connected
-            try:
-                layer = self.device.get_current_layer()
-                if layer is None:
-                    raise Exception("Device disconnected")
-            except Exception:
-                logging.info("Keyboard disconnected")
-                self.device.close()
-                self.device = None
-                self.current_layer = -1
-                self.status_action.setText("Searching for keyboard...")
-                self.tray_icon.setToolTip("Layer Monitor - Searching for keyboard...")
-                # Reset to default colors
-                self._init_layer_icons()
-                return
+            # Liveness is tracked by _poll_layer - no need to enumerate
+            return
 
-        if not self.device:
-            # Search for a new device
-            devices = find_viable_devices(quiet=True)
-            if devices:
-                try:
-                    self.device = KeyboardDevice(devices[0])
-                    self.device.open()
-                    logging.info("Connected to: %s", self.device.title())
-                    self.status_action.setText(f"Connected: {self.device.title()}")
-                    # Update icons with keyboard colors
-                    self._update_layer_icons_from_keyboard()
-                except Exception as e:
-                    logging.warning("Failed to open device: %s", e)
-                    self.device = None
+        # After a fruitless search, only re-enumerate once the set of HID
+        # devices has changed
+        token = hid_topology_token()
+        if token is not None and token == self._hid_token:
+            return
+
+        # Search for a new device
+        devices = find_viable_devices(quiet=True)
+        if not devices:
+            self._hid_token = token
+            return
+
+        # Found something: keep searching every poll until it opens
+        self._hid_token = None
+        try:
+            self.device = KeyboardDevice(devices[0])
+            self.device.open()
+            logging.info("Connected to: %s", self.device.title())
+            self.status_action.setText(f"Connected: {self.device.title()}")
+            # Update icons with keyboard colors
+            self._update_layer_icons_from_keyboard()
+        except Exception as e:
+            logging.warning("Failed to open device: %s", e)
+            self.device = None
+            self._poll_idle()
+
+    def _tick(self):
+        """Poll the layer every tick and the device connection when due."""
+        self._poll_layer()
+        now = time.monotonic()
+        if now >= self._next_device_check:
+            self._next_device_check = now + DEVICE_POLL_INTERVAL
+            self._poll_device()
 
     def _poll_layer(self):
-        """Poll the keyboard for current layer and update tray icon."""
+        """Request the current layer; the reply is read a moment later.
+
+        The request is written now and its reply collected by _collect_layer
+        LAYER_REPLY_WAIT_MS later, so the Qt thread never waits on the USB
+        round trip and a layer change still shows up within one interval.
+
+        These requests double as the liveness check: after LAYER_MAX_MISSED
+        polls without a reply, or with failed writes, the keyboard is treated
+        as disconnected.
+        """
         if not self.device:
             return
 
         try:
-            layer = self.device.get_current_layer()
-            if layer is None:
+            if self.device.submit_layer_read():
+                QTimer.singleShot(LAYER_REPLY_WAIT_MS, self._collect_layer)
                 return
+        except Exception as e:
+            logging.debug("Layer poll error: %s", e)
+        self._count_missed_reply()
 
-            if layer != self.current_layer:
-                self.current_layer = layer
-                if layer in self.layer_icons:
-                    self.tray_icon.setIcon(self.layer_icons[layer])
-                    self.tray_icon.setToolTip(f"Layer {layer}")
+    def _collect_layer(self):
+        """Read the reply to the last layer request and update the tray icon."""
+        if not self.device:
+            return
+
+        layer = None
+        try:
+            layer = self.device.poll_layer_completion()
         except Exception as e:
             logging.debug("Layer poll error: %s", e)
 
+        if layer is None:
+            self._count_missed_reply()
+            return
+        self._missed_replies = 0
+
+        if layer == self.current_layer:
+            # Back off once the layer has been stable for a while
+            self._idle_ticks += 1
+            if self._idle_ticks == LAYER_POLL_IDLE_TICKS:
+                self._timer.setInterval(LAYER_POLL_IDLE_MS)
+            return
+
+        self.current_layer = layer
+        if self._idle_ticks >= LAYER_POLL_IDLE_TICKS:
+            self._timer.setInterval(LAYER_POLL_FAST_MS)
+        self._idle_ticks = 0
+        self._apply_layer(layer)
+
+    def _count_missed_reply(self):
+        """Note a layer poll without a reply; disconnect after too many."""
+        self._missed_replies += 1
+        if self._missed_replies >= LAYER_MAX_MISSED:
+            self._disconnect()
+
+    def _apply_layer(self, layer):
+        """Show a newly active layer in the tray, skipping redundant Qt calls."""
+        icon = self.layer_icons.get(layer)
+        if icon is None:
+            return
+        # Each setIcon is an IPC round-trip on some platforms
+        if icon is not self._shown_icon:
+            self.tray_icon.setIcon(icon)
+            self._shown_icon = icon
+        self.tray_icon.setToolTip(LAYER_TOOLTIPS[layer])
+
     def quit(self):
         """Clean up and quit the application."""
         if self.device:
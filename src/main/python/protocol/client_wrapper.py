@@ -16,6 +16,7 @@ from protocol.constants import VIABLE_PREFIX
 WRAPPER_PREFIX = 0xDD
 CLIENT_ID_BOOTSTRAP = 0x00000000
 CLIENT_ID_ERROR = 0xFFFFFFFF
+VIA_PROTOCOL = 0xFE
 
 # Error codes
 CLIENT_ERR_INVALID_ID = 0x01
@@ -25,6 +26,39 @@ CLIENT_ERR_UNKNOWN_PROTO = 0x03
 # Bootstrap nonce size
 NONCE_SIZE = 20
 
+# Precompiled packet layouts
+_HDR = struct.Struct("<BI")         # prefix, client ID
+_HDR_PROTO = struct.Struct("<BIB")  # prefix, client ID, protocol byte
+_HDR_PROTO_B = struct.Struct("<BIBB")  # ... + one command byte
+_HDR_PROTO_BBB = struct.Struct("<BIBBBB")  # ... + three command bytes
+_U32 = struct.Struct("<I")
+_U16 = struct.Struct("<H")
+
+# Client ID field of a bootstrap reply
+_BOOTSTRAP_ID = _U32.pack(CLIENT_ID_BOOTSTRAP)
+
+# Nonce position in the bootstrap report (after report ID and header)
+_NONCE_OFFSET = 1 + _HDR.size
+
+# Retry delays: exponential from 1 ms, capped at 64 ms
+_BACKOFF = tuple(0.001 * (1 << i) for i in range(7))
+
+
+def _reply_status(response, proto, expected_id):
+    """Return the status byte if response is a reply to us, else None.
+
+    The status is either proto or 0xFF for a wrapper error (code at byte 6).
+    """
+    # Cheap byte compares first; client ID only for candidate replies
+    if response[0] != WRAPPER_PREFIX:
+        return None
+    status = response[5]
+    if status != proto and status != 0xFF:
+        return None
+    if response[1:5] != expected_id:
+        return None
+    return status
+
 
 class ClientWrapperError(Exception):
     """Exception raised for client wrapper protocol errors."""
@@ -41,6 +75,15 @@ class ClientWrapper:
         self.ttl_seconds = 120
         self.last_bootstrap = 0
         self._renewal_threshold = 0.70
+        # Outgoing report, reused for every send; byte 0 is the report ID
+        self._txbuf = bytearray(msg_len + 1)
+        self._zeros = memoryview(bytes(msg_len + 1))
+        # Bootstrap report: fixed header written once, only the nonce changes
+        self._bootstrap_tx = bytearray(msg_len + 1)
+        _HDR.pack_into(self._bootstrap_tx, 1, WRAPPER_PREFIX, CLIENT_ID_BOOTSTRAP)
+        # hidapi's read() with timeout_ms=0 waits forever on a blocking
+        # handle; reads with a timeout behave the same in either mode
+        dev.set_nonblocking(1)
 
     def reset(self):
         """Reset client state."""
@@ -54,42 +97,57 @@ class ClientWrapper:
         age = time.time() - self.last_bootstrap
         return age >= (self.ttl_seconds * self._renewal_threshold)
 
+    def _build_tx(self, header, fields, payload):
+        """Pack header and payload into the reusable report buffer."""
+        buf = self._txbuf
+        start = 1 + header.size
+        end = start + len(payload)
+        if end > len(buf):
+            raise ClientWrapperError(f"Command too long ({len(payload)} bytes)")
+        header.pack_into(buf, 1, *fields)
+        buf[start:end] = payload
+        buf[end:] = self._zeros[end:]
+        return buf
+
     def bootstrap(self, retries=5):
         """Bootstrap to get a new client ID from the keyboard."""
         nonce = os.urandom(NONCE_SIZE)
 
-        msg = struct.pack("<BI", WRAPPER_PREFIX, CLIENT_ID_BOOTSTRAP) + nonce
-        msg = msg + b"\x00" * (self.msg_len - len(msg))
+        tx = self._bootstrap_tx
+        tx[_NONCE_OFFSET:_NONCE_OFFSET + NONCE_SIZE] = nonce
+        write = self.dev.write
+        read = self.dev.read
+        msg_len = self.msg_len
+        expected_written = msg_len + 1
 
         for attempt in range(retries):
             try:
-                written = self.dev.write(b"\x00" + msg)
-                if written != self.msg_len + 1:
-                    time.sleep(0.1)
+                written = write(tx)
+                if written != expected_written:
+                    time.sleep(_BACKOFF[min(attempt, 6)])
                     continue
 
-                response = bytes(self.dev.read(self.msg_len, timeout_ms=500))
+                response = memoryview(bytes(read(msg_len, timeout_ms=500)))
                 if not response:
-                    time.sleep(0.1)
+                    time.sleep(_BACKOFF[min(attempt, 6)])
                     continue
 
                 if response[0] != WRAPPER_PREFIX:
                     continue
 
-                resp_id = struct.unpack("<I", response[1:5])[0]
-                if resp_id != CLIENT_ID_BOOTSTRAP:
+                # The nonce identifies our reply; the ID is a cheap sanity check
+                if response[5:5 + NONCE_SIZE] != nonce:
                     continue
 
-                resp_nonce = response[5:5 + NONCE_SIZE]
-                if resp_nonce != nonce:
+                if response[1:5] != _BOOTSTRAP_ID:
                     continue
 
-                new_id = struct.unpack("<I", response[25:29])[0]
+                new_id = _U32.unpack_from(response, 25)[0]
                 if new_id == CLIENT_ID_ERROR:
                     error_code = response[29]
                     raise ClientWrapperError(f"Bootstrap failed with error code {error_code}")
 
-                ttl = struct.unpack("<H", response[29:31])[0]
+                ttl = _U16.unpack_from(response, 29)[0]
 
                 self.client_id = new_id
                 self.ttl_seconds = ttl
@@ -99,7 +157,7 @@ class ClientWrapper:
 
             except OSError as e:
                 logging.debug("bootstrap attempt %d failed: %s", attempt + 1, e)
-                time.sleep(0.1)
+                time.sleep(_BACKOFF[min(attempt, 6)])
 
         raise ClientWrapperError("Bootstrap failed after all retries")
 
@@ -110,98 +168,191 @@ class ClientWrapper:
 
     def send_via(self, command, retries=20, read_timeout_ms=500):
         """Send a VIA protocol command wrapped with client ID."""
-        VIA_PROTOCOL = 0xFE
+        return self._send(_HDR_PROTO, (VIA_PROTOCOL,), command, 6, retries, read_timeout_ms)
+
+    def send_via_byte(self, cmd, retries=20, read_timeout_ms=500):
+        """Send a single-byte VIA command, packed together with the header."""
+        return self._send(_HDR_PROTO_B, (VIA_PROTOCOL, cmd), b"", 6, retries, read_timeout_ms)
+
+    def send_via_bbb(self, a, b, c, retries=20, read_timeout_ms=500):
+        """Send a three-byte VIA command, packed together with the header."""
+        return self._send(_HDR_PROTO_BBB, (VIA_PROTOCOL, a, b, c), b"", 6, retries, read_timeout_ms)
 
+    def send_viable(self, command, retries=20, read_timeout_ms=500):
+        """Send a Viable protocol command wrapped with client ID."""
+        return self._send(_HDR_PROTO, (VIABLE_PREFIX,), command, 5, retries, read_timeout_ms)
+
+    def _send(self, header, fields, payload, ret_off, retries, read_timeout_ms):
+        """Send a request and wait for its reply.
+
+        The report is laid out as header(prefix, client ID, *fields) + payload,
+        where fields[0] is the protocol byte the reply must echo. Returns the
+        reply from ret_off onward.
+        """
+        proto = fields[0]
         self._ensure_client_id()
 
-        msg = struct.pack("<BIB", WRAPPER_PREFIX, self.client_id, VIA_PROTOCOL) + command
-        msg = msg + b"\x00" * (self.msg_len - len(msg))
+        tx = self._build_tx(header, (WRAPPER_PREFIX, self.client_id) + fields, payload)
+        expected_id = _U32.pack(self.client_id)
+        write = self.dev.write
+        read = self.dev.read
+        msg_len = self.msg_len
+        expected_written = msg_len + 1
 
         for attempt in range(retries):
             try:
-                written = self.dev.write(b"\x00" + msg)
-                if written != self.msg_len + 1:
-                    time.sleep(0.1)
+                written = write(tx)
+                if written != expected_written:
+                    time.sleep(_BACKOFF[min(attempt, 6)])
                     continue
 
-                for _ in range(50):
-                    response = bytes(self.dev.read(self.msg_len, timeout_ms=read_timeout_ms))
+                # Drain up to 50 stale or foreign replies looking for ours
+                stale = 50
+                while stale:
+                    response = memoryview(bytes(read(msg_len, timeout_ms=read_timeout_ms)))
                     if not response:
                         break
 
-                    if response[0] != WRAPPER_PREFIX:
+                    status = _reply_status(response, proto, expected_id)
+                    if status is None:
+                        stale -= 1
                         continue
 
-                    resp_id = struct.unpack("<I", response[1:5])[0]
+                    if status == proto:
+                        return bytes(response[ret_off:])
 
-                    if resp_id != self.client_id:
-                        continue
+                    error_code = response[6]
+                    if error_code != CLIENT_ERR_INVALID_ID:
+                        raise ClientWrapperError(f"Protocol error code {error_code}")
 
-                    if response[5] == 0xFF:
-                        error_code = response[6]
-                        if error_code == CLIENT_ERR_INVALID_ID:
-                            self.bootstrap()
-                            msg = struct.pack("<BIB", WRAPPER_PREFIX, self.client_id, VIA_PROTOCOL) + command
-                            msg = msg + b"\x00" * (self.msg_len - len(msg))
-                            break
-                        else:
-                            raise ClientWrapperError(f"Protocol error code {error_code}")
-
-                    if response[5] != VIA_PROTOCOL:
-                        continue
-
-                    return response[6:]
+                    # Client ID expired: renew and resend on the next attempt
+                    self.bootstrap()
+                    tx = self._build_tx(
+                        header, (WRAPPER_PREFIX, self.client_id) + fields, payload)
+                    expected_id = _U32.pack(self.client_id)
+                    break
 
             except OSError as e:
-                logging.debug("send_via attempt %d failed: %s", attempt + 1, e)
-                time.sleep(0.1)
+                logging.debug("send (protocol 0x%02X) attempt %d failed: %s", proto, attempt + 1, e)
+                time.sleep(_BACKOFF[min(attempt, 6)])
 
         raise ClientWrapperError("Failed to communicate after all retries")
 
-    def send_viable(self, command, retries=20, read_timeout_ms=500):
-        """Send a Viable protocol command wrapped with client ID."""
+    def send_via_batch(self, commands, retries=20, read_timeout_ms=500):
+        """Send several three-byte VIA commands back-to-back, then collect the replies.
+
+        Each command is an (a, b, c) tuple, packed as for send_via_bbb.
+        Replies are matched to commands by their echoed argument bytes (VIA
+        echoes the request, overwriting the command byte with 0xFF if it is
+        unhandled). Any command whose reply doesn't arrive is retried on its
+        own through send_via_bbb. Returns the replies in command order.
+        """
         self._ensure_client_id()
 
-        msg = struct.pack("<BI", WRAPPER_PREFIX, self.client_id) + bytes([VIABLE_PREFIX]) + command
-        msg = msg + b"\x00" * (self.msg_len - len(msg))
+        expected_id = _U32.pack(self.client_id)
+        write = self.dev.write
+        read = self.dev.read
+        msg_len = self.msg_len
+        expected_written = msg_len + 1
+
+        results = [None] * len(commands)
+        pending = {}  # echoed argument bytes -> indices of commands awaiting it
+        outstanding = 0  # replies still owed for the requests written
+        for i, command in enumerate(commands):
+            tx = self._build_tx(
+                _HDR_PROTO_BBB, (WRAPPER_PREFIX, self.client_id, VIA_PROTOCOL) + command, b"")
+            try:
+                if write(tx) == expected_written:
+                    pending.setdefault(bytes(command[1:]), []).append(i)
+                    outstanding += 1
+            except OSError as e:
+                logging.debug("send_via_batch write %d failed: %s", i, e)
 
-        for attempt in range(retries):
+        # Collect every reply owed, even after an error, so none is left
+        # queued for the send_via_bbb fallback to mistake for its own
+        error_code = None
+        stale = 50
+        while outstanding and stale:
             try:
-                written = self.dev.write(b"\x00" + msg)
-                if written != self.msg_len + 1:
-                    time.sleep(0.1)
-                    continue
+                response = memoryview(bytes(read(msg_len, timeout_ms=read_timeout_ms)))
+            except OSError as e:
+                logging.debug("send_via_batch read failed: %s", e)
+                break
+            if not response:
+                break
+
+            status = _reply_status(response, VIA_PROTOCOL, expected_id)
+            if status is None:
+                stale -= 1
+                continue
+            if status == 0xFF:
+                # Wrapper errors don't echo the request; one per request owed
+                error_code = response[6]
+                outstanding -= 1
+                continue
+
+            for key, indices in pending.items():
+                if response[7:7 + len(key)] == key:
+                    results[indices.pop(0)] = bytes(response[6:])
+                    if not indices:
+                        del pending[key]
+                    outstanding -= 1
+                    break
+            else:
+                stale -= 1
+
+        if error_code is not None:
+            if error_code != CLIENT_ERR_INVALID_ID:
+                raise ClientWrapperError(f"Protocol error code {error_code}")
+            # Client ID expired: renew once; the fallback resends with the new ID
+            self.bootstrap()
 
-                for _ in range(50):
-                    response = bytes(self.dev.read(self.msg_len, timeout_ms=read_timeout_ms))
-                    if not response:
-                        break
+        for i, command in enumerate(commands):
+            if results[i] is None:
+                results[i] = self.send_via_bbb(*command, retries=retries,
+                                               read_timeout_ms=read_timeout_ms)
 
-                    if response[0] != WRAPPER_PREFIX:
-                        continue
+        return results
 
-                    resp_id = struct.unpack("<I", response[1:5])[0]
+    def submit_viable(self, command):
+        """Write a Viable protocol command without waiting for the reply.
 
-                    if resp_id != self.client_id:
-                        continue
+        Returns True if the full report was written. Collect the reply
+        with poll_viable().
+        """
+        self._ensure_client_id()
 
-                    if response[5] == 0xFF:
-                        error_code = response[6]
-                        if error_code == CLIENT_ERR_INVALID_ID:
-                            self.bootstrap()
-                            msg = struct.pack("<BI", WRAPPER_PREFIX, self.client_id) + bytes([VIABLE_PREFIX]) + command
-                            msg = msg + b"\x00" * (self.msg_len - len(msg))
-                            break
-                        else:
-                            raise ClientWrapperError(f"Protocol error code {error_code}")
-
-                    if response[5] != VIABLE_PREFIX:
-                        continue
+        tx = self._build_tx(_HDR_PROTO, (WRAPPER_PREFIX, self.client_id, VIABLE_PREFIX), command)
 
-                    return response[5:]
+        return self.dev.write(tx) == self.msg_len + 1
 
-            except OSError as e:
-                logging.debug("send_viable attempt %d failed: %s", attempt + 1, e)
-                time.sleep(0.1)
+    def poll_viable(self, max_reads=50):
+        """Drain pending reports and return the latest Viable response.
 
-        raise ClientWrapperError("Failed to communicate after all retries")
+        Reads with a zero timeout on the non-blocking handle, so it never
+        waits; returns None if no matching response is queued.
+        """
+        expected_id = _U32.pack(self.client_id)
+        read = self.dev.read
+        msg_len = self.msg_len
+        result = None
+        for _ in range(max_reads):
+            response = memoryview(bytes(read(msg_len, timeout_ms=0)))
+            if not response:
+                break
+
+            status = _reply_status(response, VIABLE_PREFIX, expected_id)
+            if status is None:
+                continue
+
+            if status == 0xFF:
+                error_code = response[6]
+                if error_code == CLIENT_ERR_INVALID_ID:
+                    # Next submit_viable() uses the new ID
+                    self.bootstrap()
+                    return None
+                raise ClientWrapperError(f"Protocol error code {error_code}")
+
+            result = response[5:]
+
+        return bytes(result) if result is not None else None
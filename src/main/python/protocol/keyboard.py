@@ -6,10 +6,15 @@ Only implements what's needed to query the current layer.
 """
 
 import struct
-import json
 import lzma
 import logging
 
+# Prefer orjson for parsing the definition when installed
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 from protocol.client_wrapper import ClientWrapper
 from protocol.constants import (
     CMD_VIA_GET_PROTOCOL_VERSION,
@@ -23,11 +28,33 @@ from protocol.constants import (
     VIABLE_LAYER_STATE_SET,
 )
 
+# Precompiled packet layouts
+_U16_BE = struct.Struct(">H")
+_U32 = struct.Struct("<I")
+_CHUNK_REQ = struct.Struct("<BHB")  # command, offset, length
+
+# Parsed definitions keyed by (device key, VIA protocol, Viable protocol, size),
+# so reconnecting the same keyboard skips the chunk fetch and LZMA/JSON decode
+_DEFINITION_CACHE = {}
+
+
+def _layer_from_state(data):
+    """Return the highest active layer from a layer_state_get reply, or None."""
+    if data and data[0] == VIABLE_PREFIX and data[1] == VIABLE_LAYER_STATE_GET:
+        # Parse 32-bit little-endian layer state mask from data[2:6]
+        layer_mask = int.from_bytes(data[2:6], "little")
+        if layer_mask == 0:
+            return 0
+        return layer_mask.bit_length() - 1
+    return None
+
+
 class Keyboard:
     """Simplified keyboard class for layer monitoring."""
 
-    def __init__(self, dev):
+    def __init__(self, dev, cache_key=None):
         self.dev = dev
+        self.cache_key = cache_key  # Stable device identity; None disables caching
         self.wrapper = ClientWrapper(dev)
         self.definition = None
         self.is_svalboard = False
@@ -45,8 +72,8 @@ class Keyboard:
 
     def _reload_via_protocol(self):
         """Get VIA protocol version."""
-        data = self.wrapper.send_via(struct.pack("B", CMD_VIA_GET_PROTOCOL_VERSION), retries=20)
-        self.via_protocol = struct.unpack(">H", data[1:3])[0]
+        data = self.wrapper.send_via_byte(CMD_VIA_GET_PROTOCOL_VERSION, retries=20)
+        self.via_protocol = _U16_BE.unpack_from(data, 1)[0]
         logging.debug("VIA protocol version: %d", self.via_protocol)
 
     def _reload_definition(self):
@@ -59,48 +86,71 @@ class Keyboard:
             self.viable_protocol = None
             return
 
-        version = struct.unpack("<I", bytes(data[2:6]))[0]
+        version = _U32.unpack_from(data, 2)[0]
         logging.debug("Viable protocol version: %d", version)
         self.viable_protocol = version
 
         # Get definition size
         data = self.wrapper.send_viable(struct.pack("B", VIABLE_DEFINITION_SIZE), retries=20)
-        sz = struct.unpack("<I", bytes(data[2:6]))[0]
+        sz = _U32.unpack_from(data, 2)[0]
         logging.debug("Definition size: %d bytes", sz)
 
-        # Fetch definition chunks
-        payload = b""
+        key = None
+        if self.cache_key is not None:
+            key = (self.cache_key, self.via_protocol, version, sz)
+            definition = _DEFINITION_CACHE.get(key)
+            if definition is not None:
+                logging.debug("Using cached definition")
+                self.definition = definition
+                return
+
+        # Fetch definition chunks, decompressing as they arrive
+        decompressor = lzma.LZMADecompressor()
+        out = bytearray()
         offset = 0
         while offset < sz:
             data = self.wrapper.send_viable(
-                struct.pack("<BHB", VIABLE_DEFINITION_CHUNK, offset, VIABLE_DEFINITION_CHUNK_SIZE),
+                _CHUNK_REQ.pack(VIABLE_DEFINITION_CHUNK, offset, VIABLE_DEFINITION_CHUNK_SIZE),
                 retries=20)
             actual_size = data[4]
-            chunk = data[5:5 + actual_size]
-            payload += chunk
+            out += decompressor.decompress(memoryview(data)[5:5 + actual_size])
             offset += actual_size
 
-        self.definition = json.loads(lzma.decompress(payload))
+        if not decompressor.eof:
+            raise lzma.LZMAError("Compressed definition ended before the end-of-stream marker")
+
+        self.definition = json_loads(out)
+        if key is not None:
+            _DEFINITION_CACHE[key] = self.definition
 
     def _reload_layers(self):
         """Get layer count."""
-        data = self.wrapper.send_via(struct.pack("B", 0x11), retries=20)  # CMD_VIA_GET_LAYER_COUNT
+        data = self.wrapper.send_via_byte(0x11, retries=20)  # CMD_VIA_GET_LAYER_COUNT
         self.layers = data[1]
         logging.debug("Layer count: %d", self.layers)
 
     def _extract_menu_ids(self, items):
-        """Recursively extract semantic IDs from menu structure."""
-        for item in items:
-            if isinstance(item, dict):
-                # Check if this item has a content array with ID info
-                content = item.get('content')
-                if isinstance(content, list) and len(content) >= 3:
-                    # Format: ["semantic_id", channel, numeric_id]
-                    if isinstance(content[0], str) and isinstance(content[2], int):
-                        self._menu_ids[content[0]] = content[2]
-                elif isinstance(content, list):
-                    # Nested content, recurse
-                    self._extract_menu_ids(content)
+        """Extract semantic IDs from menu structure.
+
+        Walks the tree depth-first in document order with an explicit stack.
+        """
+        menu_ids = self._menu_ids
+        stack = list(reversed(items))
+        while stack:
+            item = stack.pop()
+            if type(item) is not dict:
+                continue
+            # Check if this item has a content array with ID info
+            content = item.get('content')
+            if type(content) is not list:
+                continue
+            if len(content) >= 3:
+                # Format: ["semantic_id", channel, numeric_id]
+                if type(content[0]) is str and type(content[2]) is int:
+                    menu_ids[content[0]] = content[2]
+            else:
+                # Nested content, visit in order
+                stack.extend(reversed(content))
 
     def _reload_svalboard(self):
         """Load layer colors from definition if available."""
@@ -130,33 +180,35 @@ class Keyboard:
             return
 
         # Load layer colors using semantic IDs from definition
+        menu_ids = self._menu_ids
+        ids = [menu_ids.get(f"id_layer{layer}_color") for layer in range(min(self.layers, 16))]
+        values = self._via_get_values([numeric_id for numeric_id in ids if numeric_id is not None])
         self.layer_colors = []
-        for layer in range(min(self.layers, 16)):
-            semantic_id = f"id_layer{layer}_color"
-            numeric_id = self._menu_ids.get(semantic_id)
+        append = self.layer_colors.append
+        for layer, numeric_id in enumerate(ids):
             if numeric_id is None:
-                logging.debug("No ID found for %s, using default", semantic_id)
+                logging.debug("No ID found for id_layer%d_color, using default", layer)
                 default_hue = (layer * 20) % 256
-                self.layer_colors.append((default_hue, 255))
+                append((default_hue, 255))
             else:
-                data = self._via_get_value(numeric_id)
+                data = values[numeric_id]
                 if data is None:
                     default_hue = (layer * 20) % 256
-                    self.layer_colors.append((default_hue, 255))
+                    append((default_hue, 255))
                 else:
-                    self.layer_colors.append((data[0], data[1]))
+                    append((data[0], data[1]))
 
         logging.debug("Loaded %d layer colors", len(self.layer_colors))
 
-    def _via_get_value(self, value_id):
-        """Get a custom keyboard value via VIA protocol."""
-        data = self.wrapper.send_via(
-            struct.pack("BBB", CMD_VIA_CUSTOM_GET_VALUE, 0, value_id),
-            retries=20
-        )
-        if data[0] == 0xFF:
-            return None
-        return data[3:]
+    def _via_get_values(self, value_ids):
+        """Get several custom keyboard values in one pipelined batch.
+
+        Returns a dict mapping each value ID to its data, or None if unhandled.
+        """
+        commands = [(CMD_VIA_CUSTOM_GET_VALUE, 0, value_id) for value_id in value_ids]
+        replies = self.wrapper.send_via_batch(commands, retries=20)
+        return {value_id: (None if data[0] == 0xFF else data[3:])
+                for value_id, data in zip(value_ids, replies)}
 
     def get_current_layer(self):
         """Get the currently active layer from the keyboard.
@@ -171,17 +223,30 @@ class Keyboard:
                 struct.pack("B", VIABLE_LAYER_STATE_GET),
                 retries=5
             )
-            if data[0] == VIABLE_PREFIX and data[1] == VIABLE_LAYER_STATE_GET:
-                # Parse 32-bit little-endian layer state mask from data[2:6]
-                layer_mask = data[2] | (data[3] << 8) | (data[4] << 16) | (data[5] << 24)
-                # Return highest active layer
-                if layer_mask == 0:
-                    return 0
-                return (layer_mask.bit_length() - 1)
+            return _layer_from_state(data)
         except Exception:
             pass
         return None
 
+    def submit_layer_state(self):
+        """Send a layer_state_get request without waiting for the reply.
+
+        The reply is collected later by poll_current_layer().
+        """
+        if not self.viable_protocol:
+            return False
+        return self.wrapper.submit_viable(struct.pack("B", VIABLE_LAYER_STATE_GET))
+
+    def poll_current_layer(self):
+        """Get the layer from the most recent layer_state_get reply.
+
+        Does not block; returns None if no reply has arrived since the
+        last poll.
+        """
+        if not self.viable_protocol:
+            return None
+        return _layer_from_state(self.wrapper.poll_viable())
+
     def get_layer_state(self):
         """Get the full 32-bit layer state mask from the keyboard.
 
@@ -196,7 +261,7 @@ class Keyboard:
             )
             if data[0] == VIABLE_PREFIX and data[1] == VIABLE_LAYER_STATE_GET:
                 # Parse 32-bit little-endian layer state mask from data[2:6]
-                return data[2] | (data[3] << 8) | (data[4] << 16) | (data[5] << 24)
+                return int.from_bytes(data[2:6], "little")
         except Exception:
             pass
         return None